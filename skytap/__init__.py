@@ -1,6 +1,20 @@
 """Python client for the Skytap REST API."""
 
-from .skytap import SkytapClient
+from .skytap import (
+    QuotaAdmission,
+    QuotaExceededError,
+    RateLimiter,
+    SessionProvisioningError,
+    SkytapClient,
+    SkytapRouter,
+)
 
-__all__ = ["SkytapClient"]
+__all__ = [
+    "QuotaAdmission",
+    "QuotaExceededError",
+    "RateLimiter",
+    "SessionProvisioningError",
+    "SkytapClient",
+    "SkytapRouter",
+]
 __version__ = "0.1.1"
@@ -1,20 +1,313 @@
 import base64
-import json
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
-import socket
+import threading
 
 
 import os
 import time
-import csv
-import secrets
 
+# requests and python-dotenv are imported on first use (via ``_requests`` and
+# ``_load_env``) so that ``import skytap`` and client construction stay cheap.
+if TYPE_CHECKING:
+    import requests
+
+
+_ENV_CACHE: Dict[Tuple[str, int], Dict[str, Optional[str]]] = {}
+_ENV_CACHE_LOCK = threading.Lock()
+
+
+def _requests() -> Any:
+    """Import ``requests`` on first use."""
+    import requests
+
+    return requests
+
+
+def _load_env(env_file: Union[str, Path]) -> Dict[str, Optional[str]]:
+    """Parse ``env_file`` once per modification time and return a copy.
+
+    A missing file yields an empty mapping.
+    """
+    path = os.path.abspath(env_file)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    key = (path, mtime)
+    with _ENV_CACHE_LOCK:
+        cached = _ENV_CACHE.get(key)
+    if cached is None:
+        from dotenv import dotenv_values
+
+        cached = dict(dotenv_values(path))
+        with _ENV_CACHE_LOCK:
+            for stale in [k for k in _ENV_CACHE if k[0] == path]:
+                del _ENV_CACHE[stale]
+            _ENV_CACHE[key] = cached
+    return dict(cached)
+
+
+def _run_parallel(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 8,
+    stop_on_error: bool = False,
+) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """Call ``func`` for each item in a thread pool.
+
+    Yields ``(item, result, error)`` tuples in completion order; ``error`` is
+    the raised exception or ``None``. At most ``max_workers`` calls are in
+    flight; with ``stop_on_error`` no new calls start after the first error.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    pending_items = iter(list(items))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        running: Dict[Any, Any] = {}
+        failed = False
+        while True:
+            while not (stop_on_error and failed) and len(running) < max(1, max_workers):
+                try:
+                    item = next(pending_items)
+                except StopIteration:
+                    break
+                running[pool.submit(func, item)] = item
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as exc:
+                    failed = True
+                    yield item, None, exc
+
+
+def _schedule_body(
+    object_id: str,
+    title: str,
+    schedule_actions: List[Dict[str, Any]],
+    start_at: str,
+    *,
+    stype: str = "config",
+    recurring_days: Optional[str] = None,
+    end_at: Optional[str] = None,
+    timezone: str = "Pacific Time (US & Canada)",
+    delete_at_end: bool = False,
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "title": title,
+        "start_at": start_at,
+        "time_zone": timezone,
+        "actions": schedule_actions,
+    }
+    if stype == "config":
+        body["configuration_id"] = object_id
+    else:
+        body["template_id"] = object_id
+    if end_at:
+        body["end_at"] = end_at
+    if recurring_days:
+        body["recurring_days"] = recurring_days
+    if delete_at_end:
+        body["delete_at_end"] = True
+    return body
+
+
+def _tag_values(tags: Any) -> List[str]:
+    return sorted(
+        str(tag.get("value")) if isinstance(tag, dict) else str(tag) for tag in tags or []
+    )
+
+
+def _diff_snapshots(
+    old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Return change events turning snapshot ``old`` into ``new``."""
+    events: List[Dict[str, Any]] = []
+
+    def event(
+        kind: str,
+        env_id: str,
+        vm_id: Optional[str] = None,
+        before: Any = None,
+        after: Any = None,
+    ) -> None:
+        events.append({"type": kind, "env_id": env_id, "vm_id": vm_id, "old": before, "new": after})
+
+    for env_id in old.keys() - new.keys():
+        event("environment_removed", env_id, before=old[env_id])
+    for env_id, env in new.items():
+        if env_id not in old:
+            event("environment_added", env_id, after=env)
+            continue
+        prev = old[env_id]
+        for field, kind in (("runstate", "runstate"), ("name", "renamed"), ("tags", "tags")):
+            if prev.get(field) != env.get(field):
+                event(kind, env_id, before=prev.get(field), after=env.get(field))
+        if env.get("vms") is None or prev.get("vms") is None:
+            continue
+        prev_vms, vms = prev["vms"], env["vms"]
+        for vm_id in prev_vms.keys() - vms.keys():
+            event("vm_removed", env_id, vm_id, before=prev_vms[vm_id])
+        for vm_id, vm in vms.items():
+            if vm_id not in prev_vms:
+                event("vm_added", env_id, vm_id, after=vm)
+                continue
+            for field, kind in (("runstate", "vm_runstate"), ("name", "vm_renamed")):
+                before = prev_vms[vm_id].get(field)
+                if before != vm.get(field):
+                    event(kind, env_id, vm_id, before=before, after=vm.get(field))
+    return events
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests per second."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaExceededError(ValueError):
+    """Raised when planned usage does not fit in the remaining quota."""
+
+    def __init__(self, message: str, shortfall: Dict[str, float], fits: int) -> None:
+        super().__init__(message)
+        self.shortfall = shortfall
+        self.fits = fits
+
+
+class SessionProvisioningError(RuntimeError):
+    """Raised when a session is left partially provisioned."""
+
+    def __init__(self, message: str, project_id: str, environments: List[Dict[str, Any]]) -> None:
+        super().__init__(message)
+        self.project_id = project_id
+        self.environments = environments
+
+
+def _units_that_fit(headroom: Dict[str, float], requirements: Dict[str, float]) -> Optional[int]:
+    fits: Optional[int] = None
+    for qid, left in headroom.items():
+        need = requirements.get(qid, 0)
+        if need > 0:
+            count = max(0, int(left // need))
+            fits = count if fits is None else min(fits, count)
+    return fits
+
+
+class QuotaAdmission:
+    """Cache a department's quotas and reserve capacity against them.
+
+    Quotas are re-read from the API at most every ``ttl`` seconds.
+    Reservations made through this object are subtracted from the reported
+    headroom until released, so concurrent sessions cannot overcommit.
+    """
+
+    def __init__(self, client: "SkytapClient", department_id: str, ttl: float = 60.0) -> None:
+        self.client = client
+        self.department_id = department_id
+        self.ttl = ttl
+        self.reserved: Dict[str, float] = {}
+        self._quotas: Dict[str, Dict[str, Any]] = {}
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Return quotas keyed by id, fetching them if the cache is stale."""
+        with self._lock:
+            if force or not self._fetched or time.monotonic() - self._fetched > self.ttl:
+                quotas = self.client.get_department_quotas(self.department_id) or []
+                self._quotas = {
+                    str(q.get("id")): q for q in quotas if isinstance(q, dict) and q.get("id")
+                }
+                self._fetched = time.monotonic()
+            return dict(self._quotas)
+
+    def available(self) -> Dict[str, float]:
+        """Remaining headroom per limited quota, net of reservations."""
+        self.refresh()
+        with self._lock:
+            return self._headroom()
+
+    def _headroom(self) -> Dict[str, float]:
+        return {
+            qid: float(q["limit"]) - float(q.get("usage") or 0) - self.reserved.get(qid, 0)
+            for qid, q in self._quotas.items()
+            if q.get("limit") is not None
+        }
 
+    def requirements_for_template(self, template_id: str) -> Dict[str, float]:
+        """Estimate the quota one environment built from ``template_id`` uses."""
+        template = self.client.get_templates(template_id) or {}
+        vms = [vm for vm in template.get("vms") or [] if isinstance(vm, dict)]
+        hardware = [vm.get("hardware") or {} for vm in vms]
+        return {
+            "concurrent_svms": float(
+                template.get("svms") or sum(h.get("svms") or 0 for h in hardware)
+            ),
+            "concurrent_storage_size": float(
+                template.get("storage") or sum(h.get("storage") or 0 for h in hardware)
+            ),
+            "concurrent_vms": float(template.get("vm_count") or len(vms)),
+            "concurrent_environments": 1.0,
+        }
+
+    def capacity(self, requirements: Dict[str, float]) -> int:
+        """Return how many units of ``requirements`` fit, or -1 if unlimited."""
+        fits = _units_that_fit(self.available(), requirements)
+        return -1 if fits is None else fits
+
+    def reserve(self, requirements: Dict[str, float], count: int = 1) -> None:
+        """Reserve ``count`` units or raise ``QuotaExceededError``."""
+        self.refresh()
+        with self._lock:
+            headroom = self._headroom()
+            shortfall = {
+                qid: requirements.get(qid, 0) * count - left
+                for qid, left in headroom.items()
+                if requirements.get(qid, 0) > 0 and requirements.get(qid, 0) * count > left
+            }
+            if shortfall:
+                fits = _units_that_fit(headroom, requirements)
+                detail = ", ".join(f"{qid} short by {amount:g}" for qid, amount in shortfall.items())
+                raise QuotaExceededError(
+                    f"Department {self.department_id} cannot fit {count} environments "
+                    f"({detail}); at most {fits} would fit",
+                    shortfall,
+                    fits or 0,
+                )
+            for qid, need in requirements.items():
+                self.reserved[qid] = self.reserved.get(qid, 0) + need * count
 
-import requests
-from dotenv import dotenv_values
+    def release(self, requirements: Dict[str, float], count: int = 1) -> None:
+        with self._lock:
+            for qid, need in requirements.items():
+                self.reserved[qid] = max(0.0, self.reserved.get(qid, 0) - need * count)
 
 
 class SkytapClient:
@@ -26,19 +319,31 @@ class SkytapClient:
         logfile: str = "skytap.log",
         env_file: str = ".env",
         bitly_token: Optional[str] = None,
+        session: Optional["requests.Session"] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.headers: Dict[str, str] = {"Accept": "application/json"}
         self.logfile = logfile
         self.env_file = env_file
-        self.bitly_token = bitly_token
-
-        # Load bitly_token from .env if not provided
-        if bitly_token is None:
-            creds = dotenv_values(self.env_file)
-            self.bitly_token = creds.get("bitly_token")
-        else:
-            self.bitly_token = bitly_token
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self._bitly_token = bitly_token
+        self._bitly_loaded = bitly_token is not None
+        self._admissions: Dict[str, QuotaAdmission] = {}
+
+    @property
+    def bitly_token(self) -> Optional[str]:
+        """Bitly token, read from the .env file on first use if not provided."""
+        if not self._bitly_loaded:
+            self._bitly_token = _load_env(self.env_file).get("bitly_token")
+            self._bitly_loaded = True
+        return self._bitly_token
+
+    @bitly_token.setter
+    def bitly_token(self, value: Optional[str]) -> None:
+        self._bitly_token = value
+        self._bitly_loaded = True
 
     def log_write(self, message: str) -> None:
         """Append a timestamped message to the configured log file."""
@@ -48,7 +353,7 @@ class SkytapClient:
 
     def show_request_failure(self, exc: Exception) -> Dict[str, Any]:
         """Return structured information about a failed request."""
-        if isinstance(exc, requests.HTTPError):
+        if isinstance(exc, _requests().HTTPError):
             resp = exc.response
             return {
                 "requestResultCode": resp.status_code if resp else -1,
@@ -65,7 +370,7 @@ class SkytapClient:
 
     def show_web_request_failure(self, exc: Exception) -> Dict[str, Any]:
         """Simplified failure information used by the PowerShell module."""
-        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        if isinstance(exc, _requests().HTTPError) and exc.response is not None:
             return {
                 "requestResultCode": exc.response.status_code,
                 "eDescription": exc.response.reason,
@@ -80,7 +385,7 @@ class SkytapClient:
         path = Path(env_file or self.env_file)
         if not path.exists():
             raise FileNotFoundError(f"The .env file {path} was not found")
-        creds = dotenv_values(path)
+        creds = _load_env(path)
         user = creds.get("username")
         password = creds.get("password")
         bitly_token = creds.get("bitly_token")
@@ -93,12 +398,33 @@ class SkytapClient:
 
     def _request(self, method: str, path: str, **kwargs: Any) -> Any:
         url = f"{self.base_url}{path}"
-        resp = requests.request(method, url, headers=self.headers, **kwargs)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.session is not None:
+            send = self.session.request
+        else:
+            send = _requests().request
+        resp = send(method, url, headers=self.headers, **kwargs)
         resp.raise_for_status()
         if resp.text:
             return resp.json()
         return None
 
+    def _call_when_unlocked(
+        self, func: Callable[..., Any], *args: Any, attempts: int = 10, delay: float = 5.0
+    ) -> Any:
+        """Call ``func``, retrying while Skytap reports the target as locked (HTTP 423)."""
+        for attempt in range(attempts):
+            try:
+                return func(*args)
+            except _requests().HTTPError as exc:
+                status = exc.response.status_code if exc.response is not None else -1
+                if status != 423 or attempt == attempts - 1:
+                    raise
+                self.log_write(f"{func.__name__} hit a locked resource, retrying in {delay}s")
+                time.sleep(delay)
+        return None
+
     def add_configuration_to_project(self, config_id: str, project_id: str) -> Any:
         return self._request(
             "POST", f"/projects/{project_id}/configurations/{config_id}"
@@ -237,6 +563,12 @@ class SkytapClient:
     def get_department_quotas(self, department_id: str) -> Any:
         return self._request("GET", f"/departments/{department_id}/quotas")
 
+    def quota_admission(self, department_id: str) -> QuotaAdmission:
+        """Return the cached admission controller for a department."""
+        if department_id not in self._admissions:
+            self._admissions[department_id] = QuotaAdmission(self, department_id)
+        return self._admissions[department_id]
+
     def get_departments(self, department_id: Optional[str] = None) -> Any:
         path = f"/departments/{department_id}" if department_id else "/departments"
         return self._request("GET", path)
@@ -349,10 +681,12 @@ class SkytapClient:
 
     def get_metadata(self) -> Any:
         """Retrieve VM metadata from inside a Skytap VM."""
+        import socket
+
         host_ip = socket.gethostbyname(socket.gethostname())
         octets = host_ip.split(".")
         meta_ip = f"{octets[0]}.{octets[1]}.{octets[2]}.254"
-        resp = requests.get(f"http://{meta_ip}/skytap")
+        resp = _requests().get(f"http://{meta_ip}/skytap")
         resp.raise_for_status()
         return resp.json()
 
@@ -370,22 +704,21 @@ class SkytapClient:
         delete_at_end: bool = False,
     ) -> Any:
         """Create a schedule for a configuration or template."""
-        body: Dict[str, Any] = {
-            "title": title,
-            "start_at": start_at,
-            "time_zone": timezone,
-            "actions": schedule_actions,
-        }
-        if stype == "config":
-            body["configuration_id"] = object_id
-        else:
-            body["template_id"] = object_id
-        if end_at:
-            body["end_at"] = end_at
-        if recurring_days:
-            body["recurring_days"] = recurring_days
-        if delete_at_end:
-            body["delete_at_end"] = True
+        body = _schedule_body(
+            object_id,
+            title,
+            schedule_actions,
+            start_at,
+            stype=stype,
+            recurring_days=recurring_days,
+            end_at=end_at,
+            timezone=timezone,
+            delete_at_end=delete_at_end,
+        )
+        return self.create_schedule(body)
+
+    def create_schedule(self, body: Dict[str, Any]) -> Any:
+        """Create a schedule from a prepared request body."""
         return self._request("POST", "/schedules", json=body)
 
     def get_usage(
@@ -461,6 +794,12 @@ class SkytapClient:
         path = f"/schedules/{schedule_id}" if schedule_id else "/schedules"
         return self._request("GET", path)
 
+    def edit_schedule(self, schedule_id: str, attributes: Dict[str, Any]) -> Any:
+        return self._request("PUT", f"/schedules/{schedule_id}", json=attributes)
+
+    def remove_schedule(self, schedule_id: str) -> Any:
+        return self._request("DELETE", f"/schedules/{schedule_id}")
+
     def connect_public_ip(self, vm_id: str, interface_id: str, public_ip: str) -> Any:
         body = {"ip": public_ip}
         return self._request(
@@ -497,7 +836,7 @@ class SkytapClient:
                             f"/configurations/{config_id}/tags/{tid}",
                         )
                     )
-                except requests.HTTPError:
+                except _requests().HTTPError:
                     results.append(None)
             return results
         return self._request(
@@ -512,7 +851,7 @@ class SkytapClient:
         headers = {"Authorization": f"Bearer {auth}", "Content-Type": "application/json"}
         body = {"domain": "bit.ly", "long_url": long_url}
         try:
-            resp = requests.post("https://api-ssl.bitly.com/v4/shorten", headers=headers, json=body)
+            resp = _requests().post("https://api-ssl.bitly.com/v4/shorten", headers=headers, json=body)
             resp.raise_for_status()
             return resp.json().get("link", long_url)
         except Exception:
@@ -520,6 +859,8 @@ class SkytapClient:
 
     def get_share_password(self, length: int = 6) -> str:
         """Generate a random share password."""
+        import secrets
+
         chars = "ABCDEFGHJKMNOPQRSTUVWXYZ"
         return "".join(secrets.choice(chars) for _ in range(length))
 
@@ -597,8 +938,21 @@ class SkytapClient:
         *,
         spreadsheet_path: Optional[str] = None,
         disable_power_options: bool = False,
+        department_id: Optional[str] = None,
+        max_workers: int = 1,
     ) -> Dict[str, Any]:
+        """Create a project with one environment per attendee.
+
+        When ``department_id`` is given, the department's quota is checked and
+        reserved for the whole session before anything is created, raising
+        ``QuotaExceededError`` with the shortfall if it does not fit.
+        Environments are provisioned ``max_workers`` at a time. If one fails,
+        no further environments are started and ``SessionProvisioningError``
+        is raised with the project id and the environments already created.
+        """
         if spreadsheet_path:
+            import csv
+
             with open(spreadsheet_path, "r", encoding="utf-8") as fh:
                 rows = list(csv.DictReader(fh))
             names = [f"{session_name}({row.get('email','')})" for row in rows]
@@ -606,18 +960,49 @@ class SkytapClient:
         else:
             names = [f"{session_name}({i:03})" for i in range(environments_needed)]
             rows = [{} for _ in range(environments_needed)]
-        project = self.create_project(session_name)
-        self.add_template_to_project(project["id"], template_id)
-        envs = []
-        for i in range(environments_needed):
-            env = self.new_session_environment(
+        admission = self.quota_admission(department_id) if department_id else None
+        requirements: Dict[str, float] = {}
+        if admission is not None:
+            requirements = admission.requirements_for_template(template_id)
+            admission.reserve(requirements, environments_needed)
+        try:
+            project = self.create_project(session_name)
+            self.add_template_to_project(project["id"], template_id)
+        except Exception:
+            if admission is not None:
+                admission.release(requirements, environments_needed)
+            raise
+
+        def provision(i: int) -> Dict[str, Any]:
+            return self.new_session_environment(
                 project["id"],
                 template_id,
                 names[i],
                 disable_power_options=disable_power_options,
                 project_name=project.get("name"),
             )
-            envs.append({**env, **rows[i]})
+
+        created: Dict[int, Dict[str, Any]] = {}
+        failure: Optional[Exception] = None
+        for i, env, error in _run_parallel(
+            provision, range(environments_needed), max_workers, stop_on_error=True
+        ):
+            if error is not None:
+                failure = failure or error
+                continue
+            created[i] = {**env, **rows[i]}
+        envs = [created[i] for i in sorted(created)]
+        if admission is not None:
+            # Created environments now show up in the department's usage.
+            admission.release(requirements, environments_needed)
+            admission.refresh(force=True)
+        if failure is not None:
+            raise SessionProvisioningError(
+                f"Provisioning session {project['id']} stopped after {len(envs)} of "
+                f"{environments_needed} environments: {failure}",
+                project["id"],
+                envs,
+            ) from failure
         return {
             "ProjectID": project["id"],
             "SessionName": project.get("name"),
@@ -679,22 +1064,179 @@ class SkytapClient:
             env_reports.append(env_report)
         return {"report": report, "environments": env_reports}
 
-    def replace_environment_with_template(self, env_id: str, template_id: str) -> None:
+    def replace_environment_with_template(
+        self, env_id: str, template_id: str, max_workers: int = 1
+    ) -> None:
         vms = self.get_vms(env_id) or []
-        for vm in vms:
-            self.remove_vm_from_environment(env_id, vm.get("id"))
+        vm_ids = [vm.get("id") for vm in vms]
+
+        def remove(vm_id: str) -> Any:
+            return self._call_when_unlocked(self.remove_vm_from_environment, env_id, vm_id)
+
+        for _, _, error in _run_parallel(remove, vm_ids, max_workers, stop_on_error=True):
+            if error is not None:
+                raise error
         self.add_template_to_configuration(env_id, template_id)
         self.update_sharing_portal_access(env_id)
 
+    def rollout_template(
+        self,
+        project_id: str,
+        template_id: str,
+        *,
+        canary: int = 1,
+        batch_size: int = 10,
+        max_workers: int = 8,
+        vm_workers: int = 4,
+        stop_on_failure: bool = True,
+        rollback_template_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Swap ``template_id`` into every environment of a project.
+
+        The first ``canary`` environments are updated on their own, then the
+        rest in batches of ``batch_size`` with up to ``max_workers`` running at
+        once. If a batch has failures and ``stop_on_failure`` is set, the
+        remaining environments are skipped and, when ``rollback_template_id``
+        is given, every touched environment is swapped back to it.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if canary < 0:
+            raise ValueError("canary must not be negative")
+        env_ids = [env.get("id") for env in self.get_project_environments(project_id) or []]
+        batches = [env_ids[:canary]] if canary else []
+        rest = env_ids[canary:] if canary else env_ids
+        batches += [rest[i:i + batch_size] for i in range(0, len(rest), batch_size)]
+        report: Dict[str, Any] = {
+            "ProjectID": project_id,
+            "TemplateUsed": template_id,
+            "Succeeded": [],
+            "Failed": [],
+            "Skipped": [],
+            "RolledBack": [],
+        }
+
+        def replace(env_id: str) -> None:
+            self.replace_environment_with_template(env_id, template_id, max_workers=vm_workers)
+
+        for number, batch in enumerate(batches):
+            if not batch:
+                continue
+            if stop_on_failure and report["Failed"]:
+                report["Skipped"].extend(batch)
+                continue
+            for env_id, _, error in _run_parallel(replace, batch, max_workers):
+                if error is None:
+                    report["Succeeded"].append(env_id)
+                else:
+                    report["Failed"].append(
+                        {"Id": env_id, "Error": self.show_request_failure(error)}
+                    )
+            self.log_write(
+                f"Rollout of {template_id} to {project_id}: batch {number + 1}/{len(batches)} done, "
+                f"{len(report['Succeeded'])} succeeded, {len(report['Failed'])} failed"
+            )
+
+        if report["Failed"] and stop_on_failure and rollback_template_id:
+            touched = report["Succeeded"] + [f["Id"] for f in report["Failed"]]
+
+            def restore(env_id: str) -> None:
+                self.replace_environment_with_template(
+                    env_id, rollback_template_id, max_workers=vm_workers
+                )
+
+            for env_id, _, error in _run_parallel(restore, touched, max_workers):
+                if error is None:
+                    report["RolledBack"].append(env_id)
+                else:
+                    self.log_write(f"Rollback of {env_id} failed: {error}")
+        return report
+
     def remove_vm_from_environment(self, env_id: str, vm_id: str) -> Any:
         return self._request("DELETE", f"/configurations/{env_id}/vms/{vm_id}")
 
     def get_unassigned_public_ips(self, region: str = "") -> List[Any]:
-        ips = self.get_public_ips() or []
-        result = [ip for ip in ips if isinstance(ip, dict) and (ip.get("nics") == [] or ip.get("nics", []) == [])]
-        if region:
-            result = [ip for ip in result if ip.get("region") == region]
-        return result
+        return [
+            ip
+            for ip in self.get_public_ips() or []
+            if isinstance(ip, dict)
+            and not ip.get("nics")
+            and (not region or ip.get("region") == region)
+        ]
+
+    def index_unassigned_public_ips(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return unassigned public IPs grouped by region from a single listing."""
+        index: Dict[str, List[Dict[str, Any]]] = {}
+        for ip in self.get_unassigned_public_ips():
+            index.setdefault(ip.get("region", ""), []).append(ip)
+        return index
+
+    def assign_public_ips(
+        self,
+        targets: List[Dict[str, Any]],
+        region: str = "",
+        max_workers: int = 8,
+        max_attempts: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """Attach a free public IP to each ``{"vm_id", "interface_id"}`` target.
+
+        Free IPs are listed once and handed out from per-region pools. Every
+        target needs a region, either its own ``region`` key or the
+        ``region`` argument. When an IP was taken by someone else before it
+        could be attached (HTTP 409), the next free IP in that region is
+        tried, up to ``max_attempts`` times per target.
+        """
+        missing = [t.get("vm_id") for t in targets if not (t.get("region") or region)]
+        if missing:
+            raise ValueError(f"No region given for VMs {', '.join(map(str, missing))}")
+        pools = self.index_unassigned_public_ips()
+        lock = threading.Lock()
+
+        def take(ip_region: str) -> Optional[str]:
+            with lock:
+                if pools.get(ip_region):
+                    return pools[ip_region].pop(0).get("address")
+            return None
+
+        def attach(index: int) -> Dict[str, Any]:
+            target = targets[index]
+            outcome: Dict[str, Any] = {
+                "vm_id": target["vm_id"],
+                "interface_id": target["interface_id"],
+                "ip": None,
+                "error": None,
+            }
+            for _ in range(max_attempts):
+                address = take(target.get("region") or region)
+                if address is None:
+                    outcome["error"] = "No unassigned public IPs left"
+                    return outcome
+                try:
+                    self.connect_public_ip(target["vm_id"], target["interface_id"], address)
+                except _requests().HTTPError as exc:
+                    status = exc.response.status_code if exc.response is not None else -1
+                    if status != 409:
+                        outcome["error"] = self.show_request_failure(exc)
+                        return outcome
+                    self.log_write(f"Public IP {address} already taken, trying next")
+                    continue
+                outcome["ip"] = address
+                return outcome
+            outcome["error"] = f"Gave up after {max_attempts} conflicting IPs"
+            return outcome
+
+        results: List[Dict[str, Any]] = [{} for _ in targets]
+        for index, outcome, error in _run_parallel(attach, range(len(targets)), max_workers):
+            if error is not None:
+                target = targets[index]
+                outcome = {
+                    "vm_id": target.get("vm_id"),
+                    "interface_id": target.get("interface_id"),
+                    "ip": None,
+                    "error": self.show_request_failure(error),
+                }
+            results[index] = outcome
+        return results
 
     def merge_arrays(
         self, array1: List[Dict[str, Any]], array2: List[Dict[str, Any]]
@@ -707,4 +1249,594 @@ class SkytapClient:
         body = {"subnet": subnet_cidr}
         return self._request(
             "PUT", f"/configurations/{env_id}/networks/{network_id}", json=body
-        )
\ No newline at end of file
+        )
+
+    def plan_network_topology(
+        self,
+        desired: List[Dict[str, Any]],
+        max_workers: int = 8,
+        prune: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Diff a desired topology against the current networks.
+
+        Each entry of ``desired`` names an ``env_id`` and ``network_id`` and
+        may give a ``subnet`` CIDR, a list of ``wans`` to attach and connect,
+        and a list of ``tunnels`` (target network ids). Current state is
+        fetched concurrently from ``get_network`` and, for the listed WANs,
+        ``get_wan``. With ``prune`` set, tunnels on the network that
+        no entry asks for are removed. Each tunnel is connected or removed at
+        most once, even when both of its networks are listed. Returns one
+        change dict per required call.
+        """
+        networks: Dict[Tuple[str, str], Any] = {}
+
+        def fetch(entry: Dict[str, Any]) -> Any:
+            return self.get_network(entry["env_id"], entry["network_id"])
+
+        for entry, network, error in _run_parallel(fetch, desired, max_workers):
+            if error is not None:
+                raise error
+            networks[(entry["env_id"], entry["network_id"])] = network or {}
+
+        # A network's vpn_attachments can lag behind the WAN's own view, so
+        # attachments are read from both sides: network id -> connected.
+        wan_ids = {wan_id for entry in desired for wan_id in entry.get("wans") or []}
+        wan_attachments: Dict[str, Dict[str, bool]] = {}
+        for wan_id, wan, error in _run_parallel(self.get_wan, wan_ids, max_workers):
+            if error is not None:
+                raise error
+            wan_attachments[wan_id] = {
+                str((att.get("network") or {}).get("id")): bool(att.get("connected"))
+                for att in (wan or {}).get("network_attachments") or []
+                if isinstance(att, dict)
+            }
+
+        # Tunnels join two networks, so they are tracked by unordered pair to
+        # avoid planning the same tunnel from both ends.
+        wanted_pairs = {
+            frozenset((entry["network_id"], target))
+            for entry in desired
+            for target in entry.get("tunnels") or []
+        }
+        existing_pairs = set()
+        for (_, network_id), network in networks.items():
+            for tunnel in network.get("tunnels") or []:
+                if isinstance(tunnel, dict):
+                    source = (tunnel.get("source_network") or {}).get("id")
+                    target = (tunnel.get("target_network") or {}).get("id")
+                    existing_pairs.add(frozenset((source, target)))
+        planned_pairs = set()
+        removed_tunnels = set()
+
+        changes: List[Dict[str, Any]] = []
+        for entry in desired:
+            env_id, network_id = entry["env_id"], entry["network_id"]
+            network = networks[(env_id, network_id)]
+
+            def change(action: str, *args: str) -> None:
+                changes.append({
+                    "env_id": env_id,
+                    "network_id": network_id,
+                    "action": action,
+                    "args": list(args),
+                })
+
+            subnet = entry.get("subnet")
+            if subnet and network.get("subnet") != subnet:
+                change("edit_subnet", env_id, network_id, subnet)
+
+            attachments: Dict[str, bool] = {
+                (att.get("vpn") or {}).get("id"): bool(att.get("connected"))
+                for att in network.get("vpn_attachments") or []
+                if isinstance(att, dict)
+            }
+            for wan_id in entry.get("wans") or []:
+                from_wan = wan_attachments.get(wan_id, {})
+                attached = wan_id in attachments or network_id in from_wan
+                connected = attachments.get(wan_id) or from_wan.get(network_id)
+                if not attached:
+                    change("attach_wan", env_id, network_id, wan_id)
+                if not connected:
+                    change("connect_wan", env_id, network_id, wan_id)
+
+            tunnels: Dict[str, str] = {}
+            for tunnel in network.get("tunnels") or []:
+                if not isinstance(tunnel, dict):
+                    continue
+                for end in ("source_network", "target_network"):
+                    peer = (tunnel.get(end) or {}).get("id")
+                    if peer and peer != network_id:
+                        tunnels[peer] = tunnel.get("id")
+            for target in entry.get("tunnels") or []:
+                pair = frozenset((network_id, target))
+                if target not in tunnels and pair not in existing_pairs | planned_pairs:
+                    planned_pairs.add(pair)
+                    change("connect_network", network_id, target)
+            if prune:
+                for peer, tunnel_id in tunnels.items():
+                    if frozenset((network_id, peer)) in wanted_pairs or tunnel_id in removed_tunnels:
+                        continue
+                    removed_tunnels.add(tunnel_id)
+                    change("remove_network", tunnel_id)
+        return changes
+
+    def apply_network_topology(
+        self,
+        desired: List[Dict[str, Any]],
+        *,
+        dry_run: bool = False,
+        max_workers: int = 8,
+        prune: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Apply only the changes needed to reach ``desired``.
+
+        Skytap locks an environment while one of its networks changes, so
+        changes within an environment run in order (retrying while locked)
+        and different environments are updated concurrently. Returns the planned changes, each with ``result`` and
+        ``error`` keys unless ``dry_run`` is set.
+        """
+        changes = self.plan_network_topology(desired, max_workers=max_workers, prune=prune)
+        if dry_run:
+            return changes
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for item in changes:
+            grouped.setdefault(item["env_id"], []).append(item)
+
+        def apply(env_id: str) -> None:
+            failed_networks = set()
+            for item in grouped[env_id]:
+                item["result"], item["error"] = None, None
+                if item["network_id"] in failed_networks:
+                    item["error"] = "Skipped after earlier failure on this network"
+                    continue
+                try:
+                    item["result"] = self._call_when_unlocked(
+                        getattr(self, item["action"]), *item["args"]
+                    )
+                except Exception as exc:
+                    item["error"] = self.show_request_failure(exc)
+                    failed_networks.add(item["network_id"])
+
+        for _ in _run_parallel(apply, list(grouped), max_workers):
+            pass
+        return changes
+
+    def index_users(self) -> Dict[str, Dict[str, Any]]:
+        """Return existing users keyed by lower-cased login name."""
+        return {
+            str(user.get("login_name", "")).lower(): user
+            for user in self.get_users() or []
+            if isinstance(user, dict)
+        }
+
+    def onboard_users(
+        self,
+        roster_path: str,
+        *,
+        group_id: Optional[str] = None,
+        project_id: Optional[str] = None,
+        project_role: str = "participant",
+        outcome_path: Optional[str] = None,
+        max_workers: int = 8,
+        requests_per_second: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Create users from a roster CSV and add them to a group and project.
+
+        The roster needs ``email``, ``first_name`` and ``last_name`` columns;
+        ``login_name`` defaults to the email and ``group_id``, ``project_id``
+        and ``project_role`` columns override the arguments per row. Users
+        that already exist are reused, a login listed on several rows is
+        created only once, and memberships that already exist (HTTP 409/422)
+        are reported as such, so the outcome file written to ``outcome_path``
+        can be fed back in as a roster.
+        """
+        import csv
+
+        with open(roster_path, "r", encoding="utf-8") as fh:
+            rows = list(csv.DictReader(fh))
+        users = self.index_users()
+        limiter = RateLimiter(requests_per_second) if requests_per_second else None
+
+        def call(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+            if limiter is not None:
+                limiter.acquire()
+            return func(*args, **kwargs)
+
+        def add_member(func: Callable[..., Any], *args: Any, **kwargs: Any) -> str:
+            try:
+                call(func, *args, **kwargs)
+            except _requests().HTTPError as exc:
+                if exc.response is not None and exc.response.status_code in (409, 422):
+                    return "exists"
+                raise
+            return "added"
+
+        def describe(exc: Exception) -> str:
+            failure = self.show_request_failure(exc)
+            return failure["eMessage"] or failure["eDescription"] or repr(exc)
+
+        def login_of(row: Dict[str, Any]) -> str:
+            return (row.get("login_name") or row.get("email", "")).lower()
+
+        # Create each missing login once, even if it appears on several rows.
+        first_rows: Dict[str, int] = {}
+        for index, row in enumerate(rows):
+            first_rows.setdefault(login_of(row), index)
+        missing = [index for login, index in first_rows.items() if login not in users]
+
+        def create(index: int) -> Any:
+            row = rows[index]
+            return call(
+                self.add_user,
+                row.get("login_name") or row.get("email", ""),
+                row.get("first_name", ""),
+                row.get("last_name", ""),
+                row.get("email", ""),
+            )
+
+        create_errors: Dict[str, str] = {}
+        created_by: Dict[str, int] = {}
+        for index, user, error in _run_parallel(create, missing, max_workers):
+            login = login_of(rows[index])
+            if error is not None:
+                create_errors[login] = describe(error)
+            else:
+                users[login] = user
+                created_by[login] = index
+
+        def onboard(index: int) -> Dict[str, Any]:
+            row = rows[index]
+            outcome: Dict[str, Any] = {
+                **row,
+                "user_id": "",
+                "user_status": "",
+                "group_status": "",
+                "project_status": "",
+                "error": "",
+            }
+            login = login_of(row)
+            if login in create_errors:
+                outcome["user_status"] = "failed"
+                outcome["error"] = create_errors[login]
+                return outcome
+            user = users[login]
+            outcome["user_status"] = "created" if created_by.get(login) == index else "existing"
+            outcome["user_id"] = user.get("id", "")
+            row_group = row.get("group_id") or group_id
+            row_project = row.get("project_id") or project_id
+            step = "group_status"
+            try:
+                if row_group:
+                    outcome["group_status"] = add_member(
+                        self.add_user_to_group, row_group, outcome["user_id"]
+                    )
+                step = "project_status"
+                if row_project:
+                    outcome["project_status"] = add_member(
+                        self.add_user_to_project,
+                        row_project,
+                        outcome["user_id"],
+                        project_role=row.get("project_role") or project_role,
+                    )
+            except Exception as exc:
+                outcome[step] = "failed"
+                outcome["error"] = describe(exc)
+            return outcome
+
+        outcomes: List[Dict[str, Any]] = [{} for _ in rows]
+        for index, outcome, error in _run_parallel(onboard, range(len(rows)), max_workers):
+            if error is not None:
+                outcome = {**rows[index], "user_status": "failed", "error": str(error)}
+            if outcome["error"]:
+                self.log_write(f"Onboarding row {index + 1} failed: {outcome['error']}")
+            outcomes[index] = outcome
+
+        if outcome_path:
+            fields: List[str] = []
+            for outcome in outcomes:
+                fields += [key for key in outcome if key not in fields]
+            with open(outcome_path, "w", encoding="utf-8", newline="") as fh:
+                writer = csv.DictWriter(fh, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(outcomes)
+        return outcomes
+
+    def plan_schedules(
+        self,
+        object_ids: List[str],
+        title: str,
+        schedule_actions: List[Dict[str, Any]],
+        start_at: str,
+        *,
+        stype: str = "config",
+        recurring_days: Optional[str] = None,
+        end_at: Optional[str] = None,
+        timezone: str = "Pacific Time (US & Canada)",
+        delete_at_end: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Build one schedule request body per environment or template."""
+        return [
+            _schedule_body(
+                object_id,
+                title,
+                schedule_actions,
+                start_at,
+                stype=stype,
+                recurring_days=recurring_days,
+                end_at=end_at,
+                timezone=timezone,
+                delete_at_end=delete_at_end,
+            )
+            for object_id in object_ids
+        ]
+
+    def index_schedules(self) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Return existing schedules keyed by ``("config"|"template", object_id)``."""
+        index: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for schedule in self.get_schedules() or []:
+            if not isinstance(schedule, dict):
+                continue
+            if schedule.get("configuration_id"):
+                key = ("config", str(schedule["configuration_id"]))
+            elif schedule.get("template_id"):
+                key = ("template", str(schedule["template_id"]))
+            else:
+                continue
+            index.setdefault(key, []).append(schedule)
+        return index
+
+    def sync_schedules(
+        self,
+        desired: List[Dict[str, Any]],
+        *,
+        dry_run: bool = False,
+        prune: bool = False,
+        max_workers: int = 8,
+    ) -> List[Dict[str, Any]]:
+        """Create, update or delete schedules so they match ``desired``.
+
+        ``desired`` holds schedule bodies as built by ``plan_schedules``.
+        Existing schedules are matched by target and title. With ``prune``
+        set, other schedules on the same targets are deleted. Returns the
+        changes, each with ``result`` and ``error`` keys unless ``dry_run``.
+        """
+        existing = self.index_schedules()
+        compared = ("start_at", "time_zone", "end_at", "recurring_days", "delete_at_end")
+        changes: List[Dict[str, Any]] = []
+        kept = set()
+        targets = set()
+        for body in desired:
+            key = (
+                ("config", str(body["configuration_id"]))
+                if body.get("configuration_id")
+                else ("template", str(body.get("template_id")))
+            )
+            targets.add(key)
+            match = next(
+                (s for s in existing.get(key, []) if s.get("title") == body.get("title")),
+                None,
+            )
+            change = {"target": key, "title": body.get("title"), "body": body}
+            if match is None:
+                changes.append({**change, "action": "create", "schedule_id": None})
+                continue
+            kept.add(match.get("id"))
+            actions = match.get("actions") or []
+            same_actions = len(actions) == len(body["actions"]) and all(
+                isinstance(have, dict) and all(have.get(k) == v for k, v in want.items())
+                for have, want in zip(actions, body["actions"])
+            )
+            if not same_actions or any(
+                (match.get(field) or None) != (body.get(field) or None) for field in compared
+            ):
+                changes.append({**change, "action": "update", "schedule_id": match.get("id")})
+        if prune:
+            for key in targets:
+                for schedule in existing.get(key, []):
+                    if schedule.get("id") not in kept:
+                        changes.append({
+                            "target": key,
+                            "title": schedule.get("title"),
+                            "body": None,
+                            "action": "delete",
+                            "schedule_id": schedule.get("id"),
+                        })
+        if dry_run:
+            return changes
+
+        def apply(change: Dict[str, Any]) -> Any:
+            if change["action"] == "create":
+                return self.create_schedule(change["body"])
+            if change["action"] == "update":
+                return self.edit_schedule(change["schedule_id"], change["body"])
+            return self.remove_schedule(change["schedule_id"])
+
+        for change, result, error in _run_parallel(apply, changes, max_workers):
+            change["result"] = result
+            change["error"] = self.show_request_failure(error) if error is not None else None
+        return changes
+
+    def snapshot(
+        self,
+        config_ids: Optional[List[str]] = None,
+        include_vms: bool = True,
+        max_workers: int = 8,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Capture name, runstate, tags and VMs of environments by id."""
+        wanted = set(config_ids) if config_ids else None
+        snap: Dict[str, Dict[str, Any]] = {}
+        for cfg in self.get_configurations() or []:
+            if not isinstance(cfg, dict) or (wanted is not None and cfg.get("id") not in wanted):
+                continue
+            snap[str(cfg.get("id"))] = {
+                "name": cfg.get("name"),
+                "runstate": cfg.get("runstate"),
+                "tags": _tag_values(cfg.get("tags")),
+                "vms": None,
+            }
+        if include_vms:
+            for env_id, vms, error in _run_parallel(self.get_vms, list(snap), max_workers):
+                if error is not None:
+                    self.log_write(f"get_vms failed for {env_id}: {error}")
+                    continue
+                snap[env_id]["vms"] = {
+                    str(vm.get("id")): {"name": vm.get("name"), "runstate": vm.get("runstate")}
+                    for vm in vms or []
+                    if isinstance(vm, dict)
+                }
+        return snap
+
+    def iter_changes(
+        self,
+        config_ids: Optional[List[str]] = None,
+        *,
+        interval: float = 30.0,
+        min_interval: float = 5.0,
+        max_interval: float = 300.0,
+        include_vms: bool = True,
+        max_polls: Optional[int] = None,
+        max_workers: int = 8,
+    ) -> Iterator[Dict[str, Any]]:
+        """Poll environments and yield change events between snapshots.
+
+        Events are dicts with ``type``, ``env_id``, ``vm_id``, ``old`` and
+        ``new`` keys. Polling happens only while the generator is consumed.
+        The wait between polls halves while changes are seen or environments
+        are busy and grows by half when nothing changes, within
+        ``min_interval``..``max_interval``.
+        """
+        previous = self.snapshot(config_ids, include_vms, max_workers)
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            time.sleep(interval)
+            current = self.snapshot(config_ids, include_vms, max_workers)
+            polls += 1
+            events = _diff_snapshots(previous, current)
+            previous = current
+            yield from events
+            busy = any(env.get("runstate") == "busy" for env in current.values())
+            if events or busy:
+                interval = max(min_interval, interval / 2)
+            else:
+                interval = min(max_interval, interval * 1.5)
+
+    def watch(
+        self,
+        callback: Callable[[Dict[str, Any]], None],
+        config_ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Poll like ``iter_changes`` and pass each event to ``callback``.
+
+        Blocks until ``max_polls`` polls have run, or forever if not set.
+        """
+        for event in self.iter_changes(config_ids, **kwargs):
+            callback(event)
+
+
+class SkytapRouter:
+    """Fan calls out across several authenticated ``SkytapClient`` instances.
+
+    Clients that share a base URL and credentials share one HTTP connection
+    pool and, if ``requests_per_second`` is set, one rate limiter.
+    """
+
+    def __init__(
+        self, max_workers: int = 8, requests_per_second: Optional[float] = None
+    ) -> None:
+        self.clients: Dict[str, SkytapClient] = {}
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self._sessions: Dict[Tuple[str, str], "requests.Session"] = {}
+        self._limiters: Dict[Tuple[str, str], RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def add_client(
+        self, name: str, client: SkytapClient, account: Optional[str] = None
+    ) -> SkytapClient:
+        """Register an authenticated client under ``name``.
+
+        Clients are pooled by ``account`` if given, otherwise by their
+        credentials, so unauthorized clients are rejected. A rate limiter
+        already set on the client is kept.
+        """
+        credentials = client.headers.get("Authorization")
+        if not credentials:
+            raise ValueError(f"Client {name} is not authorized; call set_authorization() first")
+        key = (client.base_url, f"account:{account}" if account else credentials)
+        with self._lock:
+            if key not in self._sessions:
+                session = _requests().Session()
+                adapter = _requests().adapters.HTTPAdapter(
+                    pool_connections=self.max_workers, pool_maxsize=self.max_workers
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[key] = session
+                if self.requests_per_second:
+                    self._limiters[key] = RateLimiter(self.requests_per_second)
+            client.session = self._sessions[key]
+            if client.rate_limiter is None:
+                client.rate_limiter = self._limiters.get(key)
+            self.clients[name] = client
+        return client
+
+    def add_account(
+        self, name: str, env_file: str, base_url: str = "https://cloud.skytap.com"
+    ) -> SkytapClient:
+        """Create a client from ``env_file``, authorize it and register it."""
+        client = SkytapClient(base_url=base_url, env_file=env_file)
+        client.set_authorization()
+        return self.add_client(name, client)
+
+    def get_client(self, name: str) -> SkytapClient:
+        if name not in self.clients:
+            raise KeyError(f"No client registered as {name}")
+        return self.clients[name]
+
+    def scatter(
+        self, method: str, *args: Any, names: Optional[List[str]] = None, **kwargs: Any
+    ) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+        """Call ``method`` on every client concurrently.
+
+        Yields ``(name, result, error)`` as each client finishes. Unknown
+        ``names`` raise ``KeyError`` before any call is made.
+        """
+        targets = names if names is not None else list(self.clients)
+        clients = {name: self.get_client(name) for name in targets}
+
+        def call(name: str) -> Any:
+            return getattr(clients[name], method)(*args, **kwargs)
+
+        return _run_parallel(call, targets, self.max_workers)
+
+    def get_all_configurations(
+        self,
+        runstate: Optional[str] = None,
+        names: Optional[List[str]] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream environments from every client, tagged with an ``account`` key.
+
+        Accounts whose listing fails are logged and passed to ``on_error``
+        as ``(name, exception)`` if given.
+        """
+        for name, configs, error in self.scatter("get_configurations", names=names):
+            if error is not None:
+                self.clients[name].log_write(f"get_configurations failed for {name}: {error}")
+                if on_error is not None:
+                    on_error(name, error)
+                continue
+            for cfg in configs or []:
+                if not isinstance(cfg, dict):
+                    continue
+                if runstate and cfg.get("runstate") != runstate:
+                    continue
+                yield {**cfg, "account": name}
+
+    def get_running_environments(
+        self,
+        names: Optional[List[str]] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return self.get_all_configurations(runstate="running", names=names, on_error=on_error)
@@ -146,3 +146,536 @@ def test_get_bitly_url(monkeypatch, capsys):
     print(result)
     captured = capsys.readouterr()
     assert "bit.ly/abc" in captured.out
+
+
+def test_router_shares_session_and_streams(monkeypatch):
+    from skytap.skytap import SkytapRouter
+
+    router = SkytapRouter(requests_per_second=100)
+    a = SkytapClient(bitly_token="x")
+    b = SkytapClient(bitly_token="x")
+    c = SkytapClient(bitly_token="x")
+    a.headers["Authorization"] = b.headers["Authorization"] = "Basic one"
+    c.headers["Authorization"] = "Basic two"
+    for name, client in (("a", a), ("b", b), ("c", c)):
+        router.add_client(name, client)
+    assert a.session is b.session and a.session is not c.session
+    assert a.rate_limiter is b.rate_limiter
+
+    def configs(state):
+        return lambda method, path, **kwargs: [
+            {"id": "1", "runstate": state},
+            {"id": "2", "runstate": "stopped"},
+        ]
+
+    monkeypatch.setattr(a, "_request", configs("running"))
+    monkeypatch.setattr(b, "_request", configs("stopped"))
+    monkeypatch.setattr(c, "_request", configs("running"))
+    running = list(router.get_running_environments())
+    assert sorted(env["account"] for env in running) == ["a", "c"]
+
+
+def test_assign_public_ips_retries_on_conflict(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    ips = [
+        {"address": "1.1.1.1", "region": "US-West", "nics": []},
+        {"address": "2.2.2.2", "region": "US-West", "nics": []},
+        {"address": "3.3.3.3", "region": "US-West", "nics": [{"id": "n"}]},
+        {"address": "4.4.4.4", "region": "EMEA", "nics": []},
+    ]
+    attached = []
+
+    def fake_request(method, path, **kwargs):
+        if method == "GET":
+            return ips
+        if kwargs["json"]["ip"] == "1.1.1.1":
+            raise requests.HTTPError(response=make_response(409))
+        attached.append(kwargs["json"]["ip"])
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    monkeypatch.setattr(client, "log_write", lambda message: None)
+    result = client.assign_public_ips(
+        [{"vm_id": "v1", "interface_id": "i1"}, {"vm_id": "v2", "interface_id": "i2"}],
+        region="US-West",
+    )
+    assert [r["ip"] for r in result].count("2.2.2.2") == 1
+    assert attached == ["2.2.2.2"]
+    assert sum(1 for r in result if r["error"] == "No unassigned public IPs left") == 1
+
+
+def test_rollout_template_stops_after_failed_canary(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    swapped = []
+
+    def fake_replace(env_id, template_id, max_workers=4):
+        if env_id == "e0" and template_id == "t-new":
+            raise RuntimeError("boom")
+        swapped.append((env_id, template_id))
+
+    monkeypatch.setattr(client, "get_project_environments", lambda pid: [{"id": f"e{i}"} for i in range(4)])
+    monkeypatch.setattr(client, "replace_environment_with_template", fake_replace)
+    monkeypatch.setattr(client, "log_write", lambda message: None)
+    report = client.rollout_template("p1", "t-new", batch_size=2, rollback_template_id="t-old")
+    assert [f["Id"] for f in report["Failed"]] == ["e0"]
+    assert report["Skipped"] == ["e1", "e2", "e3"]
+    assert report["RolledBack"] == ["e0"]
+    assert swapped == [("e0", "t-old")]
+
+
+def test_apply_network_topology_only_changes_differences(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    networks = {
+        "e1": {
+            "subnet": "10.0.0.0/24",
+            "vpn_attachments": [{"vpn": {"id": "w1"}, "connected": True}],
+            "tunnels": [{"id": "t1", "source_network": {"id": "n1"}, "target_network": {"id": "n9"}}],
+        },
+        "e2": {"subnet": "10.0.0.0/24", "vpn_attachments": [], "tunnels": []},
+    }
+    calls = []
+
+    networks["e3"] = {"vpn_attachments": [], "tunnels": []}
+    wan = {"network_attachments": [{"network": {"id": "n3"}, "connected": False}]}
+
+    def fake_request(method, path, **kwargs):
+        if method == "GET":
+            return wan if path == "/wans/w1" else networks[path.split("/")[2]]
+        calls.append((method, path))
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    desired = [
+        {"env_id": "e1", "network_id": "n1", "subnet": "10.0.0.0/24", "wans": ["w1"], "tunnels": ["n9"]},
+        {"env_id": "e2", "network_id": "n2", "subnet": "10.1.0.0/24", "wans": ["w1"]},
+        {"env_id": "e3", "network_id": "n3", "wans": ["w1"]},
+    ]
+    changes = client.apply_network_topology(desired)
+    assert [(c["action"], c["env_id"]) for c in changes] == [
+        ("edit_subnet", "e2"), ("attach_wan", "e2"), ("connect_wan", "e2"), ("connect_wan", "e3")
+    ]
+    assert all(c["error"] is None for c in changes)
+    assert all("/e1/" not in path for _, path in calls)
+
+
+def test_apply_network_topology_serialises_each_environment(monkeypatch):
+    import threading
+    import time
+
+    client = SkytapClient(bitly_token="x")
+    lock = threading.Lock()
+    busy = set()
+    overlaps = []
+
+    def fake_request(method, path, **kwargs):
+        if method == "GET":
+            return {"subnet": "10.0.0.0/24"}
+        env_id = path.split("/")[2]
+        with lock:
+            if env_id in busy:
+                overlaps.append(env_id)
+            busy.add(env_id)
+        time.sleep(0.01)
+        with lock:
+            busy.discard(env_id)
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    desired = [
+        {"env_id": env_id, "network_id": network_id, "subnet": "10.9.0.0/24"}
+        for env_id in ("e1", "e2")
+        for network_id in ("n1", "n2", "n3")
+    ]
+    changes = client.apply_network_topology(desired)
+    assert len(changes) == 6 and all(c["error"] is None for c in changes)
+    assert overlaps == []
+
+
+def test_env_file_parsed_once_per_mtime(tmp_path, monkeypatch):
+    import dotenv
+
+    env = tmp_path / ".env"
+    env.write_text("bitly_token=first")
+    calls = []
+    real = dotenv.dotenv_values
+
+    def counting(path):
+        calls.append(path)
+        return real(path)
+
+    monkeypatch.setattr(dotenv, "dotenv_values", counting)
+    client = SkytapClient(env_file=str(env))
+    assert calls == []
+    assert client.bitly_token == "first"
+    assert SkytapClient(env_file=str(env)).bitly_token == "first"
+    assert len(calls) == 1
+
+    env.write_text("bitly_token=second")
+    os.utime(env, ns=(0, os.stat(env).st_mtime_ns + 1_000_000_000))
+    assert SkytapClient(env_file=str(env)).bitly_token == "second"
+    assert len(calls) == 2
+
+
+def test_import_startup_time():
+    import subprocess
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import skytap"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if total.strip().isdigit():
+            cumulative[name.strip()] = int(total)
+    assert "skytap" in cumulative
+    for heavy in ("requests", "dotenv", "csv", "socket", "secrets"):
+        assert heavy not in cumulative, f"{heavy} imported eagerly"
+
+
+def test_onboard_users_is_idempotent(tmp_path, monkeypatch):
+    import csv
+
+    roster = tmp_path / "roster.csv"
+    roster.write_text(
+        "email,first_name,last_name\n"
+        "a@example.com,Ann,A\n"
+        "b@example.com,Bob,B\n"
+    )
+    client = SkytapClient(bitly_token="x")
+    users = [{"id": "u1", "login_name": "A@example.com"}]
+    members = set()
+
+    def fake_request(method, path, **kwargs):
+        if path == "/users":
+            if method == "GET":
+                return list(users)
+            users.append({"id": f"u{len(users) + 1}", "login_name": kwargs["json"]["login_name"]})
+            return users[-1]
+        if path in members:
+            raise requests.HTTPError(response=make_response(409))
+        members.add(path)
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    outcome = tmp_path / "outcome.csv"
+    first = client.onboard_users(str(roster), group_id="g1", project_id="p1", outcome_path=str(outcome))
+    assert [r["user_status"] for r in first] == ["existing", "created"]
+    assert {r["group_status"] for r in first} == {"added"}
+
+    second = client.onboard_users(str(outcome), group_id="g1", project_id="p1")
+    assert [r["user_status"] for r in second] == ["existing", "existing"]
+    assert {r["project_status"] for r in second} == {"exists"}
+    assert len(users) == 2
+    with open(outcome, encoding="utf-8") as fh:
+        assert [row["user_id"] for row in csv.DictReader(fh)] == ["u1", "u2"]
+
+
+def test_sync_schedules_only_applies_differences(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    suspend = [{"type": "suspend", "offset": 0}]
+    existing = [
+        {"id": "s1", "configuration_id": "e1", "title": "nightly", "start_at": "2026/10/18 22:00:00",
+         "time_zone": "Pacific Time (US & Canada)", "actions": [{"id": "a", "type": "suspend", "offset": 0}]},
+        {"id": "s2", "configuration_id": "e2", "title": "nightly", "start_at": "2026/10/18 20:00:00",
+         "time_zone": "Pacific Time (US & Canada)", "actions": suspend},
+        {"id": "s3", "configuration_id": "e2", "title": "old", "start_at": "2026/01/01 00:00:00",
+         "actions": suspend},
+    ]
+    calls = []
+
+    def fake_request(method, path, **kwargs):
+        if method == "GET":
+            return existing
+        calls.append((method, path))
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    desired = client.plan_schedules(["e1", "e2", "e3"], "nightly", suspend, "2026/10/18 22:00:00")
+    plan = client.sync_schedules(desired, dry_run=True, prune=True)
+    assert sorted((c["action"], c["target"][1]) for c in plan) == [
+        ("create", "e3"), ("delete", "e2"), ("update", "e2")
+    ]
+    assert calls == []
+    client.sync_schedules(desired, prune=True)
+    assert sorted(calls) == [
+        ("DELETE", "/schedules/s3"), ("POST", "/schedules"), ("PUT", "/schedules/s2")
+    ]
+
+
+def test_new_session_fails_fast_when_quota_short(monkeypatch):
+    from skytap.skytap import QuotaExceededError
+
+    client = SkytapClient(bitly_token="x")
+    calls = []
+
+    def fake_request(method, path, **kwargs):
+        calls.append((method, path))
+        if path == "/departments/d1/quotas":
+            return [
+                {"id": "concurrent_svms", "limit": 20, "usage": 12},
+                {"id": "concurrent_storage_size", "limit": None, "usage": 5},
+            ]
+        if path == "/templates/t1":
+            return {"vms": [{"hardware": {"svms": 2, "storage": 100}}, {"hardware": {"svms": 1}}]}
+        raise AssertionError(f"unexpected call {method} {path}")
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    try:
+        client.new_session("lab", "t1", 5, department_id="d1")
+    except QuotaExceededError as exc:
+        assert exc.shortfall == {"concurrent_svms": 7.0}
+        assert exc.fits == 2
+    else:
+        raise AssertionError("expected QuotaExceededError")
+    assert all(method == "GET" for method, _ in calls)
+    assert client.quota_admission("d1").capacity({"concurrent_svms": 3}) == 2
+
+
+def test_watch_emits_only_changes(monkeypatch):
+    import skytap.skytap as module
+
+    client = SkytapClient(bitly_token="x")
+    states = [
+        ({"e1": "stopped"}, {"e1": ["v1"]}),
+        ({"e1": "running"}, {"e1": ["v1", "v2"]}),
+        ({"e1": "running"}, {"e1": ["v1", "v2"]}),
+    ]
+    polls = iter(states)
+    current = {}
+
+    def fake_request(method, path, **kwargs):
+        if path == "/configurations":
+            current["envs"], current["vms"] = next(polls)
+            return [{"id": k, "name": "lab", "runstate": v} for k, v in current["envs"].items()]
+        env_id = path.split("/")[2]
+        return [{"id": v, "runstate": "running"} for v in current["vms"][env_id]]
+
+    sleeps = []
+    monkeypatch.setattr(module.time, "sleep", sleeps.append)
+    monkeypatch.setattr(client, "_request", fake_request)
+    events = list(client.iter_changes(interval=10, max_polls=2))
+    assert [(e["type"], e["vm_id"]) for e in events] == [("runstate", None), ("vm_added", "v2")]
+    assert events[0]["old"] == "stopped" and events[0]["new"] == "running"
+    assert sleeps == [10, 5.0]
+
+    polls = iter(states)
+    seen = []
+    client.watch(seen.append, interval=10, max_polls=2)
+    assert seen == events
+
+
+def test_router_reports_account_errors(monkeypatch):
+    from skytap.skytap import SkytapRouter
+
+    router = SkytapRouter()
+    good, bad = SkytapClient(bitly_token="x"), SkytapClient(bitly_token="x")
+    good.headers["Authorization"] = "Basic good"
+    bad.headers["Authorization"] = "Basic bad"
+    router.add_client("good", good)
+    router.add_client("bad", bad)
+
+    def fail(method, path, **kwargs):
+        raise RuntimeError("down")
+
+    monkeypatch.setattr(good, "_request", lambda method, path, **kwargs: [{"id": "1"}])
+    monkeypatch.setattr(bad, "_request", fail)
+    monkeypatch.setattr(bad, "log_write", lambda message: None)
+    errors = []
+    envs = list(router.get_all_configurations(on_error=lambda name, exc: errors.append(name)))
+    assert [env["account"] for env in envs] == ["good"]
+    assert errors == ["bad"]
+    try:
+        router.scatter("get_configurations", names=["good", "zz"])
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected KeyError for unknown client")
+
+
+def test_rollout_template_rejects_bad_batching():
+    client = SkytapClient(bitly_token="x")
+    for kwargs in ({"batch_size": 0}, {"canary": -1}):
+        try:
+            client.rollout_template("p1", "t1", **kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"expected ValueError for {kwargs}")
+
+
+def test_plan_network_topology_dedupes_tunnels(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    shared = {"id": "t9", "source_network": {"id": "n1"}, "target_network": {"id": "n3"}}
+    networks = {
+        "e1": {"tunnels": [shared]},
+        "e2": {"tunnels": []},
+        "e3": {"tunnels": [shared]},
+    }
+    monkeypatch.setattr(client, "_request", lambda method, path, **kwargs: networks[path.split("/")[2]])
+    desired = [
+        {"env_id": "e1", "network_id": "n1", "tunnels": ["n2"]},
+        {"env_id": "e2", "network_id": "n2", "tunnels": ["n1"]},
+        {"env_id": "e3", "network_id": "n3"},
+    ]
+    changes = client.plan_network_topology(desired, prune=True)
+    assert [(c["action"], c["args"]) for c in changes] == [
+        ("connect_network", ["n1", "n2"]),
+        ("remove_network", ["t9"]),
+    ]
+
+
+def test_onboard_users_creates_duplicate_login_once(tmp_path, monkeypatch):
+    roster = tmp_path / "roster.csv"
+    roster.write_text(
+        "email,first_name,last_name\n"
+        "a@example.com,Ann,A\n"
+        "A@example.com,Ann,A\n"
+    )
+    client = SkytapClient(bitly_token="x")
+    posts = []
+
+    def fake_request(method, path, **kwargs):
+        if path == "/users":
+            if method == "GET":
+                return []
+            posts.append(path)
+            return {"id": "u1"}
+        raise requests.HTTPError(response=make_response(500))
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    monkeypatch.setattr(client, "log_write", lambda message: None)
+    result = client.onboard_users(str(roster), group_id="g1", max_workers=1)
+    assert posts == ["/users"]
+    assert [r["user_status"] for r in result] == ["created", "existing"]
+    assert [r["user_id"] for r in result] == ["u1", "u1"]
+    assert [r["group_status"] for r in result] == ["failed", "failed"]
+    assert all(r["error"] for r in result)
+
+
+def test_sync_schedules_detects_dropped_fields(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    suspend = [{"type": "suspend", "offset": 0}]
+    existing = [
+        {"id": "s1", "configuration_id": "e1", "title": "nightly", "start_at": "2026/10/18 22:00:00",
+         "time_zone": "Pacific Time (US & Canada)", "actions": suspend, "end_at": "2026/12/01 00:00:00",
+         "delete_at_end": False},
+    ]
+    monkeypatch.setattr(client, "_request", lambda method, path, **kwargs: existing)
+    desired = client.plan_schedules(["e1"], "nightly", suspend, "2026/10/18 22:00:00")
+    plan = client.sync_schedules(desired, dry_run=True)
+    assert [(c["action"], c["schedule_id"]) for c in plan] == [("update", "s1")]
+
+
+def test_new_session_stops_at_first_failed_environment(monkeypatch):
+    from skytap.skytap import SessionProvisioningError
+
+    client = SkytapClient(bitly_token="x")
+    started = []
+
+    def fake_environment(project_id, template_id, env_name, **kwargs):
+        started.append(env_name)
+        if env_name == "lab(001)":
+            raise RuntimeError("boom")
+        return {"Id": env_name}
+
+    monkeypatch.setattr(client, "create_project", lambda name: {"id": "p1", "name": name})
+    monkeypatch.setattr(client, "add_template_to_project", lambda project_id, template_id: None)
+    monkeypatch.setattr(client, "new_session_environment", fake_environment)
+    try:
+        client.new_session("lab", "t1", 5)
+    except SessionProvisioningError as exc:
+        assert exc.project_id == "p1"
+        assert exc.environments == [{"Id": "lab(000)"}]
+        assert isinstance(exc.__cause__, RuntimeError)
+    else:
+        raise AssertionError("expected SessionProvisioningError")
+    assert started == ["lab(000)", "lab(001)"]
+
+
+def test_quota_reserve_ignores_unused_overdrawn_quota(monkeypatch):
+    from skytap.skytap import QuotaAdmission, QuotaExceededError
+
+    client = SkytapClient(bitly_token="x")
+    quotas = [
+        {"id": "concurrent_svms", "limit": 100, "usage": 0},
+        {"id": "cumulative_svms", "limit": 10, "usage": 12},
+    ]
+    monkeypatch.setattr(client, "_request", lambda method, path, **kwargs: quotas)
+    admission = QuotaAdmission(client, "d1")
+    admission.reserve({"concurrent_svms": 2}, 3)
+    assert admission.reserved == {"concurrent_svms": 6}
+    try:
+        admission.reserve({"concurrent_svms": 2}, 48)
+    except QuotaExceededError as exc:
+        assert exc.shortfall == {"concurrent_svms": 2.0}
+        assert exc.fits == 47
+    else:
+        raise AssertionError("expected QuotaExceededError")
+
+
+def test_assign_public_ips_stays_in_region(monkeypatch):
+    client = SkytapClient(bitly_token="x")
+    ips = [{"address": f"9.9.9.{i}", "region": "EMEA", "nics": []} for i in range(3)]
+    ips.append({"address": "1.1.1.1", "region": "US-West", "nics": []})
+    attached = []
+
+    def fake_request(method, path, **kwargs):
+        if method == "GET":
+            return ips
+        attached.append(kwargs["json"]["ip"])
+        return {}
+
+    monkeypatch.setattr(client, "_request", fake_request)
+    result = client.assign_public_ips([{"vm_id": "v1", "interface_id": "i1", "region": "US-West"}])
+    assert result[0]["ip"] == "1.1.1.1" and attached == ["1.1.1.1"]
+    try:
+        client.assign_public_ips([{"vm_id": "v2", "interface_id": "i2"}])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError without a region")
+
+
+def test_replace_environment_retries_locked_vm_delete(monkeypatch):
+    import skytap.skytap as module
+
+    client = SkytapClient(bitly_token="x")
+    deletes = []
+
+    def fake_request(method, path, **kwargs):
+        if method == "DELETE":
+            deletes.append(path)
+            if len(deletes) == 1:
+                raise requests.HTTPError(response=make_response(423))
+            return None
+        return [{"id": "v1"}, {"id": "v2"}] if path.endswith("/vms") else []
+
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(client, "_request", fake_request)
+    monkeypatch.setattr(client, "log_write", lambda message: None)
+    client.replace_environment_with_template("e1", "t1", max_workers=2)
+    assert len(deletes) == 3
+    assert set(deletes) == {"/configurations/e1/vms/v1", "/configurations/e1/vms/v2"}
+
+
+def test_router_rejects_unauthorized_and_keeps_limiters():
+    from skytap.skytap import RateLimiter, SkytapRouter
+
+    router = SkytapRouter()
+    try:
+        router.add_client("anon", SkytapClient(bitly_token="x"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError for an unauthorized client")
+    limiter = RateLimiter(2)
+    client = SkytapClient(bitly_token="x", rate_limiter=limiter)
+    client.headers["Authorization"] = "Basic one"
+    router.add_client("one", client)
+    assert client.rate_limiter is limiter